@@ -1,13 +1,15 @@
 from __future__ import annotations
-import os, time, logging
-from typing import Dict, List, Optional
+import os, sys, time, logging, asyncio, functools
+from typing import Dict, List, Optional, Set, Tuple
 from pathlib import Path
+from contextvars import ContextVar
 
-from pydantic import BaseModel, Field
+import orjson
+from pydantic import BaseModel, Field, PrivateAttr
 from dotenv import load_dotenv
 from telegram import Update
 from telegram.ext import (
-    ApplicationBuilder, CommandHandler, MessageHandler,
+    ApplicationBuilder, MessageHandler,
     ContextTypes, filters, Application
 )
 
@@ -22,7 +24,18 @@ log = logging.getLogger("bacbo-bot")
 DATA_DIR = Path("data")
 DATA_DIR.mkdir(exist_ok=True)
 
-MARKETS = {"dragon", "tiger", "tie"}
+_DRAGON, _TIGER, _TIE = map(sys.intern, ("dragon", "tiger", "tie"))
+MARKETS = frozenset((_DRAGON, _TIGER, _TIE))
+
+# cache por processo: o JSON só é lido do disco no primeiro acesso
+_PROFILE_CACHE: Dict[int, "Profile"] = {}
+# write-behind: save() só marca o perfil; o flush periódico grava no disco
+_DIRTY: Set[int] = set()
+FLUSH_INTERVAL = 2.0
+# `python bot.py --pretty` grava JSON indentado (debug); por defeito é compacto
+PRETTY_JSON = "--pretty" in sys.argv
+# Profile.bets guarda só apostas abertas; as fechadas vão para data/{uid}.log.ndjson
+BETS_MAX = 50
 
 class Bet(BaseModel):
     ts: float = Field(default_factory=lambda: time.time())
@@ -37,35 +50,131 @@ class Profile(BaseModel):
     stop_loss: float = 0.0
     stop_win: float = 0.0
     cooldown_min: int = 0
-    last_bet_ts: float = 0.0
+    last_bet_ts: float = 0.0  # relógio de parede: é o que persiste entre reinícios
     bets: List[Bet] = Field(default_factory=list)
     lifetime_bets: int = 0
     lifetime_pnl: float = 0.0
-    probs: Dict[str, float] = Field(default_factory=lambda: {"dragon": 0.5, "tiger": 0.5, "tie": 0.08})
+    # agregados da sessão (atualizados em /result, zerados em /reset)
+    session_wins: int = 0
+    session_loses: int = 0
+    session_pushes: int = 0
+    session_pnl_cached: float = 0.0
+    prob_dragon: float = 0.5
+    prob_tiger: float = 0.5
+    prob_tie: float = 0.08
     # auto
     auto_enabled: bool = False
     auto_interval_min: int = 15
+    # cache do texto de advisor_suggestion (não é gravado); None = recalcular
+    _suggestion: Optional[str] = PrivateAttr(default=None)
+    # last_bet_ts convertido para o relógio monotónico (ns) no load; usado nas contas do cooldown
+    _last_bet_ns: int = PrivateAttr(default=0)
 
     def save(self, uid: int):
-        (DATA_DIR / f"{uid}.json").write_text(self.model_dump_json(indent=2), encoding="utf-8")
+        _PROFILE_CACHE[uid] = self; _DIRTY.add(uid)
+
+    @staticmethod
+    async def load(uid: int) -> "Profile":
+        cached = _PROFILE_CACHE.get(uid)
+        if cached is not None:
+            return cached
+        prof = await asyncio.to_thread(_read_profile, uid)
+        # outro handler pode ter carregado o mesmo uid enquanto líamos
+        return _PROFILE_CACHE.setdefault(uid, prof)
 
     @staticmethod
-    def load(uid: int) -> "Profile":
-        p = DATA_DIR / f"{uid}.json"
-        if p.exists():
-            return Profile.model_validate_json(p.read_text(encoding="utf-8"))
+    def from_dict(d: dict) -> "Profile":
+        """Dados gravados por nós: constrói sem validar; schema diferente → valida."""
+        # perfis antigos guardavam apostas fechadas: calcula os agregados uma vez
+        # (não dá para testar a ausência das chaves: valores default não são gravados)
+        done = [b for b in d.get("bets", ()) if b.get("pnl") is not None]
+        if done:
+            d["session_wins"] = d.get("session_wins", 0) + sum(1 for b in done if b.get("outcome") == "win")
+            d["session_loses"] = d.get("session_loses", 0) + sum(1 for b in done if b.get("outcome") == "lose")
+            d["session_pushes"] = d.get("session_pushes", 0) + sum(1 for b in done if b.get("outcome") == "push")
+            d["session_pnl_cached"] = d.get("session_pnl_cached", 0.0) + sum(b["pnl"] for b in done)
+        if "probs" in d:  # perfis antigos: dict probs → campos prob_*
+            for m, v in d.pop("probs").items():
+                if m in MARKETS: d[f"prob_{m}"] = v
+        if d.keys() <= Profile.model_fields.keys():
+            d["bets"] = [Bet.model_construct(**b) for b in d.get("bets", ())]
+            prof = Profile.model_construct(**d)
+        else:
+            prof = Profile.model_validate(d)
+        if prof.last_bet_ts:  # converte uma vez para o relógio monotónico deste processo
+            ago = max(0.0, time.time() - prof.last_bet_ts)
+            prof._last_bet_ns = time.monotonic_ns() - int(ago * NS_PER_S)
+        return prof
+
+    def dump(self) -> bytes:
+        # serializer do pydantic-core: JSON direto, sem dict intermédio nem campos default
+        return Profile.__pydantic_serializer__.to_json(
+            self, indent=2 if PRETTY_JSON else None, exclude_defaults=True
+        )
+
+def _read_profile(uid: int) -> Profile:
+    p = DATA_DIR / f"{uid}.json"
+    if not p.exists():
         return Profile()
+    d = orjson.loads(p.read_bytes())
+    closed = [b for b in d.get("bets", ()) if b.get("outcome") is not None]
+    prof = Profile.from_dict(d)
+    if closed:  # perfis antigos: arquiva o histórico fechado
+        _append_log(uid, b"".join(orjson.dumps(b) + b"\n" for b in closed))
+        prof.bets = [b for b in prof.bets if b.outcome is None]
+        # regrava já (ainda fora do cache, nesta thread): um re-load não volta a arquivar
+        _write_profile(uid, prof.dump())
+    return prof
+
+def _write_profile(uid: int, payload: bytes):
+    (DATA_DIR / f"{uid}.json").write_bytes(payload)
+
+def _append_log(uid: int, lines: bytes):
+    with open(DATA_DIR / f"{uid}.log.ndjson", "ab") as f:
+        f.write(lines)
+
+def _take_dirty() -> List[Tuple[int, bytes]]:
+    """Serializa já os perfis sujos (snapshot) e limpa o conjunto."""
+    batch = [(uid, _PROFILE_CACHE[uid].dump()) for uid in _DIRTY]
+    _DIRTY.clear()
+    return batch
+
+async def flush_profiles(context: ContextTypes.DEFAULT_TYPE):
+    for uid, payload in _take_dirty():
+        try:
+            await asyncio.to_thread(_write_profile, uid, payload)
+        except Exception:
+            log.exception("Falha a gravar perfil %s; nova tentativa no próximo flush", uid)
+            _DIRTY.add(uid)
+
+def flush_profiles_sync():
+    for uid, payload in _take_dirty():
+        try:
+            _write_profile(uid, payload)
+        except Exception:
+            log.exception("Falha a gravar perfil %s no shutdown", uid)
+            _DIRTY.add(uid)
 
 # ----------------- HELPERS ------------------
+_FMT_TRANS = str.maketrans({",": ".", ".": ","})
+
 def fmt(x: float) -> str:
-    return f"€{x:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+    return f"€{x:,.2f}".translate(_FMT_TRANS)
+
+NS_PER_S = 1_000_000_000
+_NOW_NS: ContextVar[Optional[int]] = ContextVar("now_ns", default=None)
 
-def now() -> float: return time.time()
-def session_pnl(p: Profile) -> float: return sum(b.pnl for b in p.bets if b.pnl is not None)
+def now_ns() -> int:
+    """Relógio monotónico em ns; lido uma só vez por update (with_profile / auto tick)."""
+    t = _NOW_NS.get()
+    return t if t is not None else time.monotonic_ns()
+
+def session_pnl(p: Profile) -> float: return p.session_pnl_cached
+def session_bets(p: Profile) -> int: return p.session_wins + p.session_loses + p.session_pushes
 
 def ensure_cooldown(p: Profile) -> Optional[int]:
-    if p.cooldown_min <= 0: return None
-    rem = int(p.last_bet_ts + p.cooldown_min*60 - now())
+    if p.cooldown_min <= 0 or not p.last_bet_ts: return None
+    rem = (p._last_bet_ns + p.cooldown_min*60*NS_PER_S - now_ns()) // NS_PER_S
     return rem if rem > 0 else None
 
 def kelly_fraction(p: float, b: float = 1.0) -> float:
@@ -75,7 +184,13 @@ def kelly_fraction(p: float, b: float = 1.0) -> float:
     return max(0.0, min(1.0, f))
 
 def advisor_suggestion(p: Profile) -> str:
-    m_best, prob = max([(m, p.probs.get(m,0.5)) for m in ("dragon","tiger")], key=lambda x: x[1])
+    if p._suggestion is None:
+        p._suggestion = _build_suggestion(p)
+    return p._suggestion
+
+def _build_suggestion(p: Profile) -> str:
+    if p.prob_dragon >= p.prob_tiger: m_best, prob = _DRAGON, p.prob_dragon
+    else: m_best, prob = _TIGER, p.prob_tiger
     f = kelly_fraction(prob, b=1.0)
     if prob <= 0.5 or f <= 0:
         return "📉 Sem vantagem (>50%). Recomendação: **não apostar agora**."
@@ -89,57 +204,82 @@ def advisor_suggestion(p: Profile) -> str:
         f"Use /bet <stake> <dragon|tiger|tie> e feche com /result win|lose|push."
     )
 
+# ----------------- TEXTOS -----------------
+HELP_TEXT = (
+    "Comandos:\n"
+    "/setbankroll <valor>\n"
+    "/setlimits <stop_loss> <stop_win>\n"
+    "/cooldown <min>\n"
+    "/setprob <mercado> <p 0-1>\n"
+    "/prob\n"
+    "/suggest\n"
+    "/bet <stake> <dragon|tiger|tie>\n"
+    "/result <win|lose|push>\n"
+    "/stats\n"
+    "/reset\n"
+    "/auto_on <min>  — envia sugestões automáticas a cada X minutos\n"
+    "/auto_off       — desativa envio automático\n"
+    "/ping           — teste de vida\n"
+    "/debug          — mostra configurações"
+)
+PROB_TEMPLATE = "Probabilidades:\nDragon %.3f\nTiger %.3f\nTie %.3f"
+SETPROB_TEMPLATE = "Prob %s = %.3f"
+STATS_TEMPLATE = (
+    "📊 Sessão: %d | PnL %s | WR %.1f%%\n"
+    "W/L/P: %d/%d/%d\nBanca: %s | SL %s | TP %s | Cooldown %dm\n"
+    "Vida toda: %d | PnL %s"
+)
+
 # ----------------- HANDLERS -----------------
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    uid = update.effective_user.id
-    prof = Profile.load(uid); prof.save(uid)
+def with_profile(fn=None, *, save: bool = True):
+    """Injeta o perfil (cache) do utilizador como 3.º argumento e marca-o para gravar.
+    Comandos só de leitura usam @with_profile(save=False) e não tocam no disco."""
+    if fn is None:
+        return functools.partial(with_profile, save=save)
+    @functools.wraps(fn)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        uid = update.effective_user.id
+        p = await Profile.load(uid)
+        token = _NOW_NS.set(time.monotonic_ns())
+        try:
+            return await fn(update, context, p)
+        finally:
+            _NOW_NS.reset(token)
+            if save: p.save(uid)
+    return wrapper
+
+@with_profile(save=False)
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE, p: Profile):
     await update.message.reply_text("✅ Bot ativo! Usa /help para ver comandos.")
 
 async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text(
-        "Comandos:\n"
-        "/setbankroll <valor>\n"
-        "/setlimits <stop_loss> <stop_win>\n"
-        "/cooldown <min>\n"
-        "/setprob <mercado> <p 0-1>\n"
-        "/prob\n"
-        "/suggest\n"
-        "/bet <stake> <dragon|tiger|tie>\n"
-        "/result <win|lose|push>\n"
-        "/stats\n"
-        "/reset\n"
-        "/auto_on <min>  — envia sugestões automáticas a cada X minutos\n"
-        "/auto_off       — desativa envio automático\n"
-        "/ping           — teste de vida\n"
-        "/debug          — mostra configurações"
-    )
+    await update.message.reply_text(HELP_TEXT)
 
 async def ping(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("pong ✅")
 
-async def debug(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    uid = update.effective_user.id; p = Profile.load(uid)
-    d = p.probs
+@with_profile(save=False)
+async def debug(update: Update, context: ContextTypes.DEFAULT_TYPE, p: Profile):
     await update.message.reply_text(
         "⚙️ Config atual:\n"
         f"Banca: {fmt(p.bankroll)} | SL {fmt(p.stop_loss)} | TP {fmt(p.stop_win)}\n"
         f"Cooldown: {p.cooldown_min} min | Auto: {p.auto_enabled} / {p.auto_interval_min} min\n"
-        f"Prob: DR {d['dragon']:.3f} | TG {d['tiger']:.3f} | TIE {d['tie']:.3f}\n"
-        f"Apostas (sessão): {len([b for b in p.bets if b.pnl is not None])}"
+        f"Prob: DR {p.prob_dragon:.3f} | TG {p.prob_tiger:.3f} | TIE {p.prob_tie:.3f}\n"
+        f"Apostas (sessão): {session_bets(p)}"
     )
 
-async def setbankroll(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    uid = update.effective_user.id; p = Profile.load(uid)
+@with_profile
+async def setbankroll(update: Update, context: ContextTypes.DEFAULT_TYPE, p: Profile):
     try:
         v = float(context.args[0]); assert v>0
     except Exception:
         await update.message.reply_text("Uso: /setbankroll <valor positivo>")
         return
-    p.bankroll = v; p.save(uid)
+    p.bankroll = v; p._suggestion = None
     await update.message.reply_text(f"Banca definida: {fmt(v)}")
 
-async def setlimits(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    uid = update.effective_user.id; p = Profile.load(uid)
+@with_profile
+async def setlimits(update: Update, context: ContextTypes.DEFAULT_TYPE, p: Profile):
     if len(context.args)!=2:
         await update.message.reply_text("Uso: /setlimits <stop_loss> <stop_win>")
         return
@@ -148,11 +288,11 @@ async def setlimits(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception:
         await update.message.reply_text("Valores inválidos.")
         return
-    p.stop_loss, p.stop_win = sl, sw; p.save(uid)
+    p.stop_loss, p.stop_win = sl, sw
     await update.message.reply_text(f"Limites: SL {fmt(sl)} | TP {fmt(sw)}")
 
-async def cooldown(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    uid = update.effective_user.id; p = Profile.load(uid)
+@with_profile
+async def cooldown(update: Update, context: ContextTypes.DEFAULT_TYPE, p: Profile):
     if not context.args:
         await update.message.reply_text(f"Cooldown atual: {p.cooldown_min} min. Use /cooldown <min>.")
         return
@@ -161,11 +301,11 @@ async def cooldown(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception:
         await update.message.reply_text("Indique minutos ≥ 0.")
         return
-    p.cooldown_min = m; p.save(uid)
+    p.cooldown_min = m
     await update.message.reply_text(f"Cooldown definido: {m} min.")
 
-async def setprob(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    uid = update.effective_user.id; p = Profile.load(uid)
+@with_profile
+async def setprob(update: Update, context: ContextTypes.DEFAULT_TYPE, p: Profile):
     if len(context.args)!=2:
         await update.message.reply_text("Uso: /setprob <dragon|tiger|tie> <prob 0-1>")
         return
@@ -178,31 +318,31 @@ async def setprob(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if market not in MARKETS:
         await update.message.reply_text("Mercado inválido.")
         return
-    p.probs[market] = prob; p.save(uid)
-    await update.message.reply_text(f"Prob {market} = {prob:.3f}")
+    setattr(p, f"prob_{market}", prob); p._suggestion = None
+    await update.message.reply_text(SETPROB_TEMPLATE % (market, prob))
 
-async def prob(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    uid = update.effective_user.id; p = Profile.load(uid); d = p.probs
-    await update.message.reply_text(
-        f"Probabilidades:\nDragon {d['dragon']:.3f}\nTiger {d['tiger']:.3f}\nTie {d['tie']:.3f}"
-    )
+@with_profile(save=False)
+async def prob(update: Update, context: ContextTypes.DEFAULT_TYPE, p: Profile):
+    await update.message.reply_text(PROB_TEMPLATE % (p.prob_dragon, p.prob_tiger, p.prob_tie))
 
-async def suggest(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    uid = update.effective_user.id; p = Profile.load(uid)
-    rem = ensure_cooldown(p); pnl_s = session_pnl(p)
+@with_profile(save=False)
+async def suggest(update: Update, context: ContextTypes.DEFAULT_TYPE, p: Profile):
+    # verificação mais barata primeiro: em cooldown nem olha para o PnL
+    rem = ensure_cooldown(p)
+    if rem:
+        await update.message.reply_text(f"⏳ Cooldown: {rem}s.")
+        return
+    pnl_s = session_pnl(p)
     if p.stop_loss and pnl_s <= -abs(p.stop_loss):
         await update.message.reply_text("🛑 Stop-loss atingido.")
         return
     if p.stop_win and pnl_s >= abs(p.stop_win):
         await update.message.reply_text("✅ Objetivo de lucro atingido.")
         return
-    if rem:
-        await update.message.reply_text(f"⏳ Cooldown: {rem}s.")
-        return
     await update.message.reply_text(advisor_suggestion(p))
 
-async def bet(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    uid = update.effective_user.id; p = Profile.load(uid)
+@with_profile
+async def bet(update: Update, context: ContextTypes.DEFAULT_TYPE, p: Profile):
     if len(context.args)!=2:
         await update.message.reply_text("Uso: /bet <stake> <mercado>")
         return
@@ -212,16 +352,19 @@ async def bet(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception:
         await update.message.reply_text("Parâmetros inválidos.")
         return
+    if len(p.bets) >= BETS_MAX:
+        await update.message.reply_text(f"Já tem {BETS_MAX} apostas abertas. Feche com /result antes de apostar.")
+        return
     rem = ensure_cooldown(p)
     if rem:
         await update.message.reply_text(f"⏳ Aguarde {rem}s.")
         return
     p.bets.append(Bet(stake=stake, market=market))
-    p.last_bet_ts = time.time(); p.save(uid)
+    p._last_bet_ns = now_ns(); p.last_bet_ts = time.time()
     await update.message.reply_text(f"Aposta registada: {fmt(stake)} em {market}.")
 
-async def result_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    uid = update.effective_user.id; p = Profile.load(uid)
+@with_profile
+async def result_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE, p: Profile):
     if not context.args:
         await update.message.reply_text("Uso: /result <win|lose|push>")
         return
@@ -229,88 +372,127 @@ async def result_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if outcome not in {"win","lose","push"}:
         await update.message.reply_text("Resultado inválido.")
         return
-    open_bet = next((b for b in reversed(p.bets) if b.outcome is None), None)
-    if not open_bet:
+    if not p.bets:
         await update.message.reply_text("Não há aposta aberta.")
         return
-    open_bet.outcome = outcome
-    if outcome=="win": open_bet.pnl = open_bet.stake
-    elif outcome=="lose": open_bet.pnl = -open_bet.stake
-    else: open_bet.pnl = 0.0
-    p.lifetime_bets += 1; p.lifetime_pnl += open_bet.pnl; p.bankroll += open_bet.pnl
-    p.save(uid)
-    await update.message.reply_text(f"Fechada: {outcome.upper()} | PnL {fmt(open_bet.pnl)} | Banca {fmt(p.bankroll)}")
-
-async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    uid = update.effective_user.id; p = Profile.load(uid)
-    bets_done = [b for b in p.bets if b.pnl is not None]
-    session_bets = len(bets_done)
-    wins = sum(1 for b in bets_done if b.outcome=="win")
-    loses = sum(1 for b in bets_done if b.outcome=="lose")
-    pushes = sum(1 for b in bets_done if b.outcome=="push")
-    pnl_s = sum(b.pnl for b in bets_done) if bets_done else 0.0
-    wr = (wins/session_bets*100) if session_bets else 0.0
-    await update.message.reply_text(
-        f"📊 Sessão: {session_bets} | PnL {fmt(pnl_s)} | WR {wr:.1f}%\n"
-        f"W/L/P: {wins}/{loses}/{pushes}\nBanca: {fmt(p.bankroll)} | SL {fmt(p.stop_loss)} | TP {fmt(p.stop_win)} | Cooldown {p.cooldown_min}m\n"
-        f"Vida toda: {p.lifetime_bets} | PnL {fmt(p.lifetime_pnl)}"
-    )
-
-async def reset_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    uid = update.effective_user.id; p = Profile.load(uid)
-    p.session_start = time.time(); p.bets = []; p.save(uid)
+    open_bet = p.bets.pop()
+    pnl = open_bet.stake if outcome=="win" else -open_bet.stake if outcome=="lose" else 0.0
+    closed = open_bet.model_copy(update={"outcome": outcome, "pnl": pnl})
+    # arquiva antes de mexer no perfil: se o log falhar, a aposta volta a ficar aberta
+    try:
+        await asyncio.to_thread(_append_log, update.effective_user.id, orjson.dumps(closed.model_dump()) + b"\n")
+    except Exception:
+        p.bets.append(open_bet)
+        raise
+    if outcome=="win": p.session_wins += 1
+    elif outcome=="lose": p.session_loses += 1
+    else: p.session_pushes += 1
+    p.lifetime_bets += 1; p.lifetime_pnl += pnl; p.bankroll += pnl
+    p.session_pnl_cached += pnl; p._suggestion = None
+    await update.message.reply_text(f"Fechada: {outcome.upper()} | PnL {fmt(pnl)} | Banca {fmt(p.bankroll)}")
+
+@with_profile(save=False)
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE, p: Profile):
+    wins, loses, pushes = p.session_wins, p.session_loses, p.session_pushes
+    n = wins + loses + pushes
+    wr = (wins/n*100) if n else 0.0
+    await update.message.reply_text(STATS_TEMPLATE % (
+        n, fmt(p.session_pnl_cached), wr, wins, loses, pushes,
+        fmt(p.bankroll), fmt(p.stop_loss), fmt(p.stop_win), p.cooldown_min,
+        p.lifetime_bets, fmt(p.lifetime_pnl),
+    ))
+
+@with_profile
+async def reset_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE, p: Profile):
+    p.session_start = time.time(); p.bets = []
+    p.session_wins = p.session_loses = p.session_pushes = 0; p.session_pnl_cached = 0.0
     await update.message.reply_text("Sessão reiniciada.")
 
 # ----------------- AUTO (JobQueue) -----------------
-def _cancel_jobs_for(chat_id: int, context: ContextTypes.DEFAULT_TYPE):
-    jq = getattr(context, "job_queue", None)
-    if not jq:
-        return
-    for j in jq.get_jobs_by_name(f"auto-{chat_id}"):
-        j.schedule_removal()
+# um único job global percorre os chats com auto ligado: chat_id → (próximo envio, intervalo) em ns
+_AUTO_SUBSCRIBERS: Dict[int, Tuple[int, int]] = {}
+AUTO_TICK = 30
 
-async def auto_tick(context: ContextTypes.DEFAULT_TYPE):
-    chat_id = context.job.chat_id
+async def auto_tick(bot, chat_id: int):
     uid = chat_id  # conversa 1:1
-    p = Profile.load(uid)
-    rem = ensure_cooldown(p)
+    p = await Profile.load(uid)
+    sub = _AUTO_SUBSCRIBERS.get(chat_id)
+    if sub:  # o intervalo vem do /auto_on, não do perfil (em grupos chat_id ≠ uid)
+        _AUTO_SUBSCRIBERS[chat_id] = (now_ns() + sub[1], sub[1])
+    if ensure_cooldown(p):
+        return
     pnl_s = session_pnl(p)
     if p.stop_loss and pnl_s <= -abs(p.stop_loss):
-        await context.bot.send_message(chat_id, "🛑 Stop-loss atingido. Auto desligado.")
-        _cancel_jobs_for(chat_id, context); p.auto_enabled = False; p.save(uid); return
+        await bot.send_message(chat_id, "🛑 Stop-loss atingido. Auto desligado.")
+        _AUTO_SUBSCRIBERS.pop(chat_id, None); p.auto_enabled = False; p.save(uid); return
     if p.stop_win and pnl_s >= abs(p.stop_win):
-        await context.bot.send_message(chat_id, "✅ Objetivo de lucro atingido. Auto desligado.")
-        _cancel_jobs_for(chat_id, context); p.auto_enabled = False; p.save(uid); return
-    if rem:
+        await bot.send_message(chat_id, "✅ Objetivo de lucro atingido. Auto desligado.")
+        _AUTO_SUBSCRIBERS.pop(chat_id, None); p.auto_enabled = False; p.save(uid); return
+    await bot.send_message(chat_id, advisor_suggestion(p))
+
+async def global_auto_tick(context: ContextTypes.DEFAULT_TYPE):
+    t = time.monotonic_ns()
+    due = [c for c, (nxt, _) in _AUTO_SUBSCRIBERS.items() if nxt <= t]
+    if not due:
         return
-    await context.bot.send_message(chat_id, advisor_suggestion(p))
-
-async def auto_on(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    token = _NOW_NS.set(t)  # as tasks do gather herdam o mesmo instante
+    try:
+        results = await asyncio.gather(*(auto_tick(context.bot, c) for c in due), return_exceptions=True)
+    finally:
+        _NOW_NS.reset(token)
+    for chat_id, r in zip(due, results):
+        if isinstance(r, Exception):
+            log.error("auto_tick falhou para %s", chat_id, exc_info=r)
+
+@with_profile
+async def auto_on(update: Update, context: ContextTypes.DEFAULT_TYPE, p: Profile):
     chat_id = update.effective_chat.id
-    uid = update.effective_user.id
-    p = Profile.load(uid)
     try:
         minutes = int(context.args[0]) if context.args else p.auto_interval_min
         assert minutes >= 1
     except Exception:
         await update.message.reply_text("Uso: /auto_on <minutos>  (ex.: /auto_on 5)")
         return
-    p.auto_enabled = True; p.auto_interval_min = minutes; p.save(uid)
-    _cancel_jobs_for(chat_id, context)
-
-    jq = context.job_queue
-    jq.run_repeating(
-        auto_tick, interval=minutes*60, first=0, chat_id=chat_id, name=f"auto-{chat_id}"
-    )
+    p.auto_enabled = True; p.auto_interval_min = minutes
+    interval = minutes*60*NS_PER_S
+    _AUTO_SUBSCRIBERS[chat_id] = (now_ns() + interval, interval)
     await update.message.reply_text(f"🔔 Auto ligado: enviarei sugestões a cada {minutes} min. Use /auto_off para parar.")
+    await auto_tick(context.bot, chat_id)  # primeiro envio imediato
 
-async def auto_off(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
-    uid = update.effective_user.id
-    _cancel_jobs_for(chat_id, context)
-    p = Profile.load(uid); p.auto_enabled = False; p.save(uid)
+@with_profile
+async def auto_off(update: Update, context: ContextTypes.DEFAULT_TYPE, p: Profile):
+    _AUTO_SUBSCRIBERS.pop(update.effective_chat.id, None)
+    p.auto_enabled = False
     await update.message.reply_text("🔕 Auto desligado.")
 
+# ----------------- DISPATCH -----------------
+HANDLERS = {
+    "start": start,
+    "help": help_cmd,
+    "ping": ping,
+    "debug": debug,
+    "setbankroll": setbankroll,
+    "setlimits": setlimits,
+    "cooldown": cooldown,
+    "setprob": setprob,
+    "prob": prob,
+    "suggest": suggest,
+    "bet": bet,
+    "result": result_cmd,
+    "stats": stats,
+    "reset": reset_cmd,
+    "auto_on": auto_on,
+    "auto_off": auto_off,
+}
+
+async def _dispatch(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    head, *args = update.message.text.split()
+    cmd, _, target = head[1:].partition("@")
+    if target and target.lower() != context.bot.username.lower():
+        return  # comando para outro bot (grupos)
+    context.args = args  # o CommandHandler preenchia isto
+    await HANDLERS.get(cmd.lower(), help_cmd)(update, context)
+
 # ----------------- ERROR HANDLER -----------------
 async def on_error(update: object, context: ContextTypes.DEFAULT_TYPE):
     log.exception("Unhandled error", exc_info=context.error)
@@ -328,31 +510,21 @@ async def post_init(application: Application):
     # evita conflito: garante que não há webhook pendente
     await application.bot.delete_webhook(drop_pending_updates=True)
 
+async def post_shutdown(application: Application):
+    # grava o que ainda estiver pendente do write-behind
+    flush_profiles_sync()
+
 def main():
     load_dotenv()
     token = os.getenv("BOT_TOKEN")
     if not token:
         raise RuntimeError("BOT_TOKEN não definido. Configure no Render (Environment).")
 
-    app = ApplicationBuilder().token(token).post_init(post_init).build()
-
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(CommandHandler("help", help_cmd))
-    app.add_handler(CommandHandler("ping", ping))
-    app.add_handler(CommandHandler("debug", debug))
-    app.add_handler(CommandHandler("setbankroll", setbankroll))
-    app.add_handler(CommandHandler("setlimits", setlimits))
-    app.add_handler(CommandHandler("cooldown", cooldown))
-    app.add_handler(CommandHandler("setprob", setprob))
-    app.add_handler(CommandHandler("prob", prob))
-    app.add_handler(CommandHandler("suggest", suggest))
-    app.add_handler(CommandHandler("bet", bet))
-    app.add_handler(CommandHandler("result", result_cmd))
-    app.add_handler(CommandHandler("stats", stats))
-    app.add_handler(CommandHandler("reset", reset_cmd))
-    app.add_handler(CommandHandler("auto_on", auto_on))
-    app.add_handler(CommandHandler("auto_off", auto_off))
-    app.add_handler(MessageHandler(filters.COMMAND, help_cmd))
+    app = ApplicationBuilder().token(token).post_init(post_init).post_shutdown(post_shutdown).build()
+    app.job_queue.run_repeating(flush_profiles, interval=FLUSH_INTERVAL, first=FLUSH_INTERVAL, name="flush-profiles")
+    app.job_queue.run_repeating(global_auto_tick, interval=AUTO_TICK, first=AUTO_TICK, name="auto-tick")
+
+    app.add_handler(MessageHandler(filters.COMMAND & filters.UpdateType.MESSAGE, _dispatch))
     app.add_error_handler(on_error)
 
     log.info("Bot a correr…")